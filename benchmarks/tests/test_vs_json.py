@@ -73,6 +73,8 @@ for y in range(100):
 datasets = [
     ("composite object", composite_object),
     ("256 doubles array", doubles),
+    ("256 small ints array", list(range(-128, 128))),
+    ("256 wide ints array", [randint(0, maxsize) for _ in range(256)]),
     ("256 unicode array", unicode_strings),
     ("256 ASCII array", strings),
     ("256 Trues array", booleans),
@@ -6,6 +6,7 @@ from ._decoder import loads as loads
 from ._encoder import CBOREncoder as CBOREncoder
 from ._encoder import dump as dump
 from ._encoder import dumps as dumps
+from ._encoder import record_encoder as record_encoder
 from ._encoder import shareable_encoder as shareable_encoder
 from ._types import CBORDecodeEOF as CBORDecodeEOF
 from ._types import CBORDecodeError as CBORDecodeError
@@ -4,14 +4,20 @@ import math
 import re
 import struct
 import sys
+from array import array
 from collections import OrderedDict, defaultdict
 from collections.abc import Callable, Generator, Mapping, Sequence, Set
 from contextlib import contextmanager
-from datetime import date, datetime, time, tzinfo
+from dataclasses import fields as dataclass_fields
+from dataclasses import is_dataclass
+from datetime import date, datetime, time, timezone, tzinfo
 from functools import wraps
 from io import BytesIO
+from keyword import iskeyword
+from operator import itemgetter
 from sys import modules
 from typing import IO, TYPE_CHECKING, Any, cast
+from unicodedata import normalize
 
 from ._types import (
     CBOREncodeTypeError,
@@ -36,6 +42,57 @@ if TYPE_CHECKING:
         from typing_extensions import Buffer
 
 
+# Precompiled packers for the initial byte and argument of a data item
+_pack_B = struct.Struct(">B").pack
+_pack_BB = struct.Struct(">BB").pack
+_pack_BH = struct.Struct(">BH").pack
+_pack_BL = struct.Struct(">BL").pack
+_pack_BQ = struct.Struct(">BQ").pack
+_pack_Bd = struct.Struct(">Bd").pack
+
+# Single and half precision float formats, tried in this order by encode_minimal_float()
+_narrow_float_structs = ((struct.Struct(">Bf"), 0xFA), (struct.Struct(">Be"), 0xF9))
+
+# Aware datetimes are encoded as timestamps by subtracting this from them
+_epoch = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# Complete encodings of the integers -256 to 255, indexed by the integer itself (the
+# negative integers occupy the end of the tuple, in ascending order)
+_small_int_heads = tuple(
+    _pack_B(value) if value < 24 else _pack_BB(24, value) for value in range(256)
+) + tuple(
+    _pack_B(0x20 | value) if value < 24 else _pack_BB(0x38, value) for value in range(255, -1, -1)
+)
+
+# The same encodings keyed by the integer, for looking up array items that may be out of
+# range (indexing _small_int_heads would wrap around for -512 to -257)
+_small_int_encodings = {value: _small_int_heads[value] for value in range(-256, 256)}
+
+# Initial bytes of byte and text strings shorter than 24 bytes
+_short_bytestring_heads = tuple(_pack_B(0x40 | length) for length in range(24))
+_short_string_heads = tuple(_pack_B(0x60 | length) for length in range(24))
+
+# Arrays at least this long are checked for items that can be encoded in bulk
+_MIN_BULK_ARRAY_LENGTH = 32
+
+# Payloads up to this size are concatenated with their header and written in one call
+_MAX_JOINED_WRITE = 4096
+
+
+def _encode_head(major_tag: int, length: int) -> bytes:
+    major_tag <<= 5
+    if length < 24:
+        return _pack_B(major_tag | length)
+    elif length < 256:
+        return _pack_BB(major_tag | 24, length)
+    elif length < 65536:
+        return _pack_BH(major_tag | 25, length)
+    elif length < 4294967296:
+        return _pack_BL(major_tag | 26, length)
+    else:
+        return _pack_BQ(major_tag | 27, length)
+
+
 def shareable_encoder(
     func: Callable[[CBOREncoder, Any], None],
 ) -> Callable[[CBOREncoder, Any], None]:
@@ -95,6 +152,13 @@ def container_encoder(
     return wrapper
 
 
+def _encode_with_default(encoder: CBOREncoder, value: Any) -> None:
+    if encoder.default is None:
+        raise CBOREncodeTypeError("cannot serialize type %s" % value.__class__.__name__)
+
+    encoder.default(encoder, value)
+
+
 class CBOREncoder:
     """
     The CBOREncoder class implements a fully featured `CBOR`_ encoder with
@@ -119,6 +183,7 @@ class CBOREncoder:
         "_fp_write",
         "_shared_containers",
         "_encoders",
+        "_encoders_get",
         "_canonical",
         "string_referencing",
         "string_namespacing",
@@ -127,6 +192,7 @@ class CBOREncoder:
 
     _fp: IO[bytes]
     _fp_write: Callable[[Buffer], int]
+    _encoders_get: Callable[[type], Callable[[CBOREncoder, Any], None] | None]
 
     def __init__(
         self,
@@ -187,7 +253,10 @@ class CBOREncoder:
         if canonical:
             self._encoders.update(canonical_encoders)
 
-    def _find_encoder(self, obj_type: type) -> Callable[[CBOREncoder, Any], None] | None:
+        self._encoders_get = self._encoders.get
+
+    def _find_encoder(self, obj_type: type) -> Callable[[CBOREncoder, Any], None]:
+        # Replace deferred (module name, type name) entries whose modules have been imported
         for type_or_tuple, enc in list(self._encoders.items()):
             if type(type_or_tuple) is tuple:
                 try:
@@ -203,17 +272,23 @@ class CBOREncoder:
                 if imported_type is not None:
                     del self._encoders[type_or_tuple]
                     self._encoders[imported_type] = enc
-                    type_ = imported_type
-                else:  # pragma: nocover
-                    continue
-            else:
-                type_ = type_or_tuple
 
-            if issubclass(obj_type, type_):
+        # Use the encoder of the closest registered base class, if any
+        for base in obj_type.__mro__:
+            encoder = self._encoders_get(base)
+            if encoder is not None:
+                self._encoders[obj_type] = encoder
+                return encoder
+
+        # Fall back to subclass checks to catch virtual subclasses of registered ABCs
+        for type_or_tuple, enc in list(self._encoders.items()):
+            if isinstance(type_or_tuple, type) and issubclass(obj_type, type_or_tuple):
                 self._encoders[obj_type] = enc
                 return enc
 
-        return None
+        # Remember that only the default hook can encode this type
+        self._encoders[obj_type] = _encode_with_default
+        return _encode_with_default
 
     @property
     def fp(self) -> IO[bytes]:
@@ -306,10 +381,7 @@ class CBOREncoder:
             the object to encode
         """
         obj_type = obj.__class__
-        encoder = self._encoders.get(obj_type) or self._find_encoder(obj_type) or self._default
-        if not encoder:
-            raise CBOREncodeTypeError("cannot serialize type %s" % obj_type.__name__)
-
+        encoder = self._encoders_get(obj_type) or self._find_encoder(obj_type)
         encoder(self, obj)
 
     def encode_to_bytes(self, obj: Any) -> bytes:
@@ -321,26 +393,33 @@ class CBOREncoder:
         taking advantage of the shared value registry.
         """
         with BytesIO() as fp:
-            old_fp = self.fp
-            self.fp = fp
-            self.encode(obj)
-            self.fp = old_fp
+            old_fp, old_fp_write = self._fp, self._fp_write
+            self._fp, self._fp_write = fp, fp.write
+            try:
+                self.encode(obj)
+            finally:
+                self._fp, self._fp_write = old_fp, old_fp_write
+
             return fp.getvalue()
 
     def encode_container(self, encoder: Callable[[CBOREncoder, Any], Any], value: Any) -> None:
         if self.string_namespacing:
             # Create a new string reference domain
             self.encode_length(6, 256)
-
-        with self.disable_string_namespacing():
+            self.string_namespacing = False
+            try:
+                self.encode_shared(encoder, value)
+            finally:
+                self.string_namespacing = True
+        else:
             self.encode_shared(encoder, value)
 
     def encode_shared(self, encoder: Callable[[CBOREncoder, Any], Any], value: Any) -> None:
         value_id = id(value)
-        try:
-            index = self._shared_containers[id(value)][1]
-        except KeyError:
-            if self.value_sharing:
+        if self.value_sharing:
+            try:
+                index = self._shared_containers[value_id][1]
+            except KeyError:
                 # Mark the container as shareable
                 self._shared_containers[value_id] = (
                     value,
@@ -349,21 +428,21 @@ class CBOREncoder:
                 self.encode_length(6, 0x1C)
                 encoder(self, value)
             else:
-                self._shared_containers[value_id] = (value, None)
-                try:
-                    encoder(self, value)
-                finally:
-                    del self._shared_containers[value_id]
-        else:
-            if self.value_sharing:
                 # Generate a reference to the previous index instead of
                 # encoding this again
                 self.encode_length(6, 0x1D)
                 self.encode_int(cast(int, index))
-            else:
-                raise CBOREncodeValueError(
-                    "cyclic data structure detected but value sharing is disabled"
-                )
+        elif value_id in self._shared_containers:
+            raise CBOREncodeValueError(
+                "cyclic data structure detected but value sharing is disabled"
+            )
+        else:
+            # Only track the container while it's being encoded to detect cycles
+            self._shared_containers[value_id] = (value, None)
+            try:
+                encoder(self, value)
+            finally:
+                del self._shared_containers[value_id]
 
     def _stringref(self, value: str | bytes) -> bool:
         """
@@ -396,21 +475,13 @@ class CBOREncoder:
             return False
 
     def encode_length(self, major_tag: int, length: int) -> None:
-        major_tag <<= 5
-        if length < 24:
-            self._fp_write(struct.pack(">B", major_tag | length))
-        elif length < 256:
-            self._fp_write(struct.pack(">BB", major_tag | 24, length))
-        elif length < 65536:
-            self._fp_write(struct.pack(">BH", major_tag | 25, length))
-        elif length < 4294967296:
-            self._fp_write(struct.pack(">BL", major_tag | 26, length))
-        else:
-            self._fp_write(struct.pack(">BQ", major_tag | 27, length))
+        self._fp_write(_encode_head(major_tag, length))
 
     def encode_int(self, value: int) -> None:
+        if -256 <= value < 256:
+            self._fp_write(_small_int_heads[value])
         # Big integers (2 ** 64 and over)
-        if value >= 18446744073709551616 or value < -18446744073709551616:
+        elif value >= 18446744073709551616 or value < -18446744073709551616:
             if value >= 0:
                 major_type = 0x02
             else:
@@ -420,20 +491,31 @@ class CBOREncoder:
             payload = value.to_bytes((value.bit_length() + 7) // 8, "big")
             self.encode_semantic(CBORTag(major_type, payload))
         elif value >= 0:
-            self.encode_length(0, value)
+            self._fp_write(_encode_head(0, value))
         else:
-            self.encode_length(1, -(value + 1))
+            self._fp_write(_encode_head(1, -(value + 1)))
 
     def encode_bytestring(self, value: bytes) -> None:
         if self.string_referencing:
             if self._stringref(value):
                 return
 
-        self.encode_length(2, len(value))
-        self._fp_write(value)
+        length = len(value)
+        if length < 24:
+            self._fp_write(_short_bytestring_heads[length] + value)
+        elif length <= _MAX_JOINED_WRITE:
+            self._fp_write(_encode_head(2, length) + value)
+        else:
+            self._fp_write(_encode_head(2, length))
+            self._fp_write(value)
 
     def encode_bytearray(self, value: bytearray) -> None:
-        self.encode_bytestring(bytes(value))
+        if self.string_referencing or len(value) <= _MAX_JOINED_WRITE:
+            self.encode_bytestring(bytes(value))
+        else:
+            # Write large bytearrays as is rather than copying them to bytes first
+            self._fp_write(_encode_head(2, len(value)))
+            self._fp_write(value)
 
     def encode_string(self, value: str) -> None:
         if self.string_referencing:
@@ -441,21 +523,96 @@ class CBOREncoder:
                 return
 
         encoded = value.encode("utf-8")
-        self.encode_length(3, len(encoded))
-        self._fp_write(encoded)
+        length = len(encoded)
+        if length < 24:
+            self._fp_write(_short_string_heads[length] + encoded)
+        elif length <= _MAX_JOINED_WRITE:
+            self._fp_write(_encode_head(3, length) + encoded)
+        else:
+            self._fp_write(_encode_head(3, length))
+            self._fp_write(encoded)
 
-    @container_encoder
-    def encode_array(self, value: Sequence[Any]) -> None:
+    def _encode_array_items_bulk(self, value: Sequence[Any]) -> bytes | bytearray | None:
+        """
+        Encode the items of an array of only small integers or only finite floats
+        in one go.
+
+        Returns None if the items must be encoded one by one.
+        """
+        # Rule out most other arrays by their first and last items before scanning them all
+        first, last = value[0], value[-1]
+        item_type = type(first)
+        if type(last) is not item_type:
+            return None
+
+        if item_type is int:
+            if (
+                not -256 <= first < 256
+                or not -256 <= last < 256
+                or self._encoders_get(int) is not CBOREncoder.encode_int
+            ):
+                return None
+
+            # The exact type check must come first, as True and 1.0 hash equal to 1
+            if set(map(type, value)) != {int}:
+                return None
+
+            try:
+                return b"".join(map(_small_int_encodings.__getitem__, value))
+            except KeyError:
+                return None
+        elif item_type is float:
+            if (
+                self._encoders_get(float) is not CBOREncoder.encode_float
+                or set(map(type, value)) != {float}
+            ):
+                return None
+
+            # NaN and infinity are written as half-precision floats by encode_float()
+            if math.isfinite(sum(value)):
+                doubles = array("d", value)
+                if sys.byteorder == "little":
+                    doubles.byteswap()
+
+                # Interleave the 0xfb initial bytes with the big-endian doubles
+                packed = doubles.tobytes()
+                encoded = bytearray(b"\xfb" * (9 * len(doubles)))
+                for offset in range(8):
+                    encoded[offset + 1 :: 9] = packed[offset::8]
+
+                return encoded
+
+        return None
+
+    def _encode_array(self, value: Sequence[Any]) -> None:
         self.encode_length(4, len(value))
+        encode = self.encode
         for item in value:
-            self.encode(item)
+            encode(item)
+
+    def encode_array(self, value: Sequence[Any]) -> None:
+        length = len(value)
+        if length >= _MIN_BULK_ARRAY_LENGTH and not self.value_sharing:
+            # Arrays of only numbers can't be part of a cycle, so unless they need to be
+            # marked as shareable, they can skip the container bookkeeping
+            encoded_items = self._encode_array_items_bulk(value)
+            if encoded_items is not None:
+                if self.string_namespacing:
+                    self.encode_length(6, 256)
+
+                self.encode_length(4, length)
+                self._fp_write(encoded_items)
+                return
+
+        self.encode_container(CBOREncoder._encode_array, value)
 
     @container_encoder
     def encode_map(self, value: Mapping[Any, Any]) -> None:
         self.encode_length(5, len(value))
+        encode = self.encode
         for key, val in value.items():
-            self.encode(key)
-            self.encode(val)
+            encode(key)
+            encode(val)
 
     def encode_sortable_key(self, value: Any) -> tuple[int, bytes]:
         """
@@ -463,16 +620,22 @@ class CBOREncoder:
         representation, along with the representation itself. This is used as
         the sorting key in CBOR's canonical representations.
         """
-        with self.disable_string_referencing():
+        old_string_referencing = self.string_referencing
+        self.string_referencing = False
+        try:
             encoded = self.encode_to_bytes(value)
-            return len(encoded), encoded
+        finally:
+            self.string_referencing = old_string_referencing
+
+        return len(encoded), encoded
 
     @container_encoder
     def encode_canonical_map(self, value: Mapping[Any, Any]) -> None:
         """Reorder keys according to Canonical CBOR specification"""
         keyed_keys = ((self.encode_sortable_key(key), key, value) for key, value in value.items())
         self.encode_length(5, len(value))
-        for sortkey, realkey, value in sorted(keyed_keys):
+        # Sort on the encoded keys alone so that the keys and values never get compared
+        for sortkey, realkey, value in sorted(keyed_keys, key=itemgetter(0)):
             if self.string_referencing:
                 # String referencing requires that the order encoded is
                 # the same as the order emitted so string references are
@@ -511,12 +674,15 @@ class CBOREncoder:
                 )
 
         if self.datetime_as_timestamp:
-            from calendar import timegm
+            if value.utcoffset() is None:
+                # A tzinfo that returns no offset makes the datetime effectively naive;
+                # treat its wall time as UTC, as utctimetuple() would
+                value = value.replace(tzinfo=timezone.utc)
 
-            if not value.microsecond:
-                timestamp: float = timegm(value.utctimetuple())
-            else:
-                timestamp = timegm(value.utctimetuple()) + value.microsecond / 1000000
+            delta = value - _epoch
+            timestamp: float = delta.days * 86400 + delta.seconds
+            if delta.microseconds:
+                timestamp += delta.microseconds / 1000000
 
             self.encode_semantic(CBORTag(1, timestamp))
         else:
@@ -542,12 +708,12 @@ class CBOREncoder:
         elif value.is_infinite():
             self._fp_write(b"\xf9\x7c\x00" if value > 0 else b"\xf9\xfc\x00")
         else:
+            from decimal import Decimal
+
+            # Rebuilding the digits as an integral Decimal is exact and lets the C
+            # implementation do the base conversion
             dt = value.as_tuple()
-            sig = 0
-            for digit in dt.digits:
-                sig = (sig * 10) + digit
-            if dt.sign:
-                sig = -sig
+            sig = int(Decimal((dt.sign, dt.digits, 0)))
             with self.disable_value_sharing():
                 self.encode_semantic(CBORTag(4, [dt.exponent, sig]))
 
@@ -584,7 +750,7 @@ class CBOREncoder:
 
     def encode_canonical_set(self, value: Set[Any]) -> None:
         # Semantic tag 258
-        values = sorted((self.encode_sortable_key(key), key) for key in value)
+        values = sorted(((self.encode_sortable_key(key), key) for key in value), key=itemgetter(0))
         self.encode_semantic(CBORTag(258, [key[1] for key in values]))
 
     def encode_ipaddress(self, value: IPv4Address | IPv6Address) -> None:
@@ -601,18 +767,18 @@ class CBOREncoder:
 
     def encode_simple_value(self, value: CBORSimpleValue) -> None:
         if value.value < 24:
-            self._fp_write(struct.pack(">B", 0xE0 | value.value))
+            self._fp_write(_pack_B(0xE0 | value.value))
         else:
-            self._fp_write(struct.pack(">BB", 0xF8, value.value))
+            self._fp_write(_pack_BB(0xF8, value.value))
 
     def encode_float(self, value: float) -> None:
+        if math.isfinite(value):
+            self._fp_write(_pack_Bd(0xFB, value))
         # Handle special values efficiently
-        if math.isnan(value):
+        elif math.isnan(value):
             self._fp_write(b"\xf9\x7e\x00")
-        elif math.isinf(value):
-            self._fp_write(b"\xf9\x7c\x00" if value > 0 else b"\xf9\xfc\x00")
         else:
-            self._fp_write(struct.pack(">Bd", 0xFB, value))
+            self._fp_write(b"\xf9\x7c\x00" if value > 0 else b"\xf9\xfc\x00")
 
     def encode_minimal_float(self, value: float) -> None:
         # Handle special values efficiently
@@ -622,12 +788,12 @@ class CBOREncoder:
             self._fp_write(b"\xf9\x7c\x00" if value > 0 else b"\xf9\xfc\x00")
         else:
             # Try each encoding in turn from longest to shortest
-            encoded = struct.pack(">Bd", 0xFB, value)
-            for format, tag in [(">Bf", 0xFA), (">Be", 0xF9)]:
+            encoded = _pack_Bd(0xFB, value)
+            for float_struct, tag in _narrow_float_structs:
                 try:
-                    new_encoded = struct.pack(format, tag, value)
+                    new_encoded = float_struct.pack(tag, value)
                     # Check if encoding as low-byte float loses precision
-                    if struct.unpack(format, new_encoded)[1] == value:
+                    if float_struct.unpack(new_encoded)[1] == value:
                         encoded = new_encoded
                     else:
                         break
@@ -802,3 +968,88 @@ def dump(
         date_as_datetime=date_as_datetime,
         string_referencing=string_referencing,
     ).encode(obj)
+
+
+def record_encoder(
+    cls: type, fields: Sequence[str] | None = None, tag: int | None = None
+) -> Callable[[CBOREncoder, Any], None]:
+    """
+    Generate an encoder function that serializes instances of the given class as maps
+    of attribute names to attribute values.
+
+    The map keys are encoded once, up front, and baked into the generated function in
+    canonical order, so only the attribute values need to be dispatched when encoding
+    an instance. The returned function can be used as (or called from) a ``default``
+    hook. If string referencing is enabled, the instance is instead converted to a dict
+    and encoded as such.
+
+    :param cls:
+        the class whose instances are to be encoded
+    :param fields:
+        names of the attributes to encode (if omitted, ``cls`` must be a dataclass and
+        its fields are used)
+    :param tag:
+        if given, wrap each map in a semantic tag with this number
+    :return: an encoder function taking the encoder and the value to encode
+
+    """
+    if fields is None:
+        if not is_dataclass(cls):
+            raise TypeError(f"{cls.__qualname__} is not a dataclass, so fields must be given")
+
+        fields = [field.name for field in dataclass_fields(cls)]
+    elif isinstance(fields, str):
+        raise TypeError("fields must be a sequence of attribute names, not a string")
+
+    # The names are pasted into generated source, so reject any that the compiler would
+    # NFKC-normalize into a different attribute than the key written for them
+    for name in fields:
+        if (
+            not isinstance(name, str)
+            or not name.isidentifier()
+            or iskeyword(name)
+            or normalize("NFKC", name) != name
+        ):
+            raise ValueError(f"invalid attribute name: {name!r}")
+
+    if len(set(fields)) != len(fields):
+        raise ValueError("duplicate attribute names in fields")
+
+    if tag is not None and not 0 <= tag < 18446744073709551616:
+        raise ValueError(f"invalid tag number: {tag}")
+
+    prefix = _encode_head(5, len(fields))
+    if tag is not None:
+        prefix = _encode_head(6, tag) + prefix
+
+    # Keys encoded with string referencing enabled must be registered as references,
+    # so in that case the instance is encoded as a dict
+    encoded_keys = sorted((dumps(name), name) for name in fields)
+    dict_expression = ", ".join(f"{name!r}: value.{name}" for _, name in encoded_keys)
+    lines = [
+        "def encode_record(encoder, value):",
+        "    if encoder.string_referencing:",
+    ]
+    if tag is not None:
+        lines.append(f"        encoder.write({_encode_head(6, tag)!r})")
+
+    lines += [
+        f"        encoder.encode({{{dict_expression}}})",
+        "        return",
+        "",
+        "    write = encoder.write",
+        "    encode = encoder.encode",
+    ]
+    for encoded_key, name in encoded_keys:
+        lines.append(f"    write({prefix + encoded_key!r})")
+        lines.append(f"    encode(value.{name})")
+        prefix = b""
+
+    if prefix:
+        lines.append(f"    write({prefix!r})")
+
+    namespace: dict[str, Any] = {}
+    exec(compile("\n".join(lines), f"<record encoder for {cls.__qualname__}>", "exec"), namespace)
+    encode_record: Callable[[CBOREncoder, Any], None] = namespace["encode_record"]
+    encode_record.__qualname__ = encode_record.__name__ = f"encode_{cls.__name__}"
+    return encode_record
@@ -2084,6 +2084,8 @@ static PyMemberDef CBOREncoder_members[] = {
         "the sub-type to use when encoding datetime objects"},
     {"value_sharing", T_BOOL, offsetof(CBOREncoderObject, value_sharing), 0,
         "if True, then efficiently encode recursive structures"},
+    {"string_referencing", T_BOOL, offsetof(CBOREncoderObject, string_referencing), READONLY,
+        "if True, then strings are currently being encoded as string references"},
     {NULL}
 };
 
@@ -1,7 +1,9 @@
 import re
+from abc import ABC
 from binascii import unhexlify
 from collections import OrderedDict
-from datetime import date, datetime, timedelta, timezone
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone, tzinfo
 from decimal import Decimal
 from email.mime.text import MIMEText
 from fractions import Fraction
@@ -12,7 +14,7 @@ from uuid import UUID
 import pytest
 from hypothesis import given
 
-from cbor2 import FrozenDict, shareable_encoder
+from cbor2 import FrozenDict, record_encoder, shareable_encoder
 
 from .hypothesis_strategies import compound_types_strategy
 
@@ -77,6 +79,21 @@ def test_encoders_load_type(impl):
             )
 
 
+def test_encoders_virtual_subclass(impl):
+    class Base(ABC):
+        pass
+
+    class Virtual:
+        pass
+
+    Base.register(Virtual)
+    with BytesIO() as stream:
+        encoder = impl.CBOREncoder(stream)
+        encoder._encoders[Base] = lambda self, value: self.encode("virtual")
+        encoder.encode(Virtual())
+        assert stream.getvalue() == b"\x67virtual"
+
+
 def test_encode_length(impl):
     # This test is purely for coverage in the C variant
     with BytesIO() as stream:
@@ -114,6 +131,8 @@ def test_dump(impl):
         (23, "17"),
         (24, "1818"),
         (100, "1864"),
+        (255, "18ff"),
+        (256, "190100"),
         (1000, "1903e8"),
         (1000000, "1a000f4240"),
         (1000000000000, "1b000000e8d4a51000"),
@@ -121,9 +140,15 @@ def test_dump(impl):
         (18446744073709551616, "c249010000000000000000"),
         (-18446744073709551616, "3bffffffffffffffff"),
         (-18446744073709551617, "c349010000000000000000"),
+        (2**128, "c25101" + "00" * 16),
+        (-(2**128) - 1, "c35101" + "00" * 16),
         (-1, "20"),
         (-10, "29"),
+        (-24, "37"),
+        (-25, "3818"),
         (-100, "3863"),
+        (-256, "38ff"),
+        (-257, "390100"),
         (-1000, "3903e7"),
     ],
 )
@@ -165,6 +190,11 @@ def test_bytearray(impl):
     assert impl.dumps(bytearray(b"\x01\x02\x03\x04")) == expected
 
 
+def test_large_bytearray(impl):
+    value = bytearray(range(256)) * 100
+    assert impl.dumps(value) == b"\x59\x64\x00" + value
+
+
 @pytest.mark.parametrize(
     "value, expected",
     [
@@ -297,6 +327,22 @@ def test_date_as_datetime(impl):
     assert impl.dumps(date(2013, 3, 21), timezone=timezone.utc, date_as_datetime=True) == expected
 
 
+class NoOffsetTimezone(tzinfo):
+    def utcoffset(self, dt):
+        return None
+
+    def dst(self, dt):
+        return None
+
+    def tzname(self, dt):
+        return None
+
+
+def test_datetime_no_utcoffset_as_timestamp(impl):
+    value = datetime(2020, 1, 1, tzinfo=NoOffsetTimezone())
+    assert impl.dumps(value, datetime_as_timestamp=True) == unhexlify("c11a5e0be100")
+
+
 def test_naive_datetime(impl):
     """Test that naive datetimes are gracefully rejected when no timezone has been set."""
     with pytest.raises(impl.CBOREncodeError) as exc:
@@ -313,11 +359,12 @@ def test_naive_datetime(impl):
     [
         (Decimal("14.123"), "c4822219372b"),
         (Decimal("-14.123"), "C4822239372A"),
+        (Decimal("1" * 30 + ".5"), "c48220c24d0e063191caf8f3b304471c71cb"),
         (Decimal("NaN"), "f97e00"),
         (Decimal("Infinity"), "f97c00"),
         (Decimal("-Infinity"), "f9fc00"),
     ],
-    ids=["normal", "negative", "nan", "inf", "neginf"],
+    ids=["normal", "negative", "bignum", "nan", "inf", "neginf"],
 )
 def test_decimal(impl, value, expected):
     expected = unhexlify(expected)
@@ -462,6 +509,20 @@ def test_default(impl):
     assert serialized == expected
 
 
+def test_default_set_after_failure(impl):
+    class DummyType:
+        pass
+
+    with BytesIO() as stream:
+        encoder = impl.CBOREncoder(stream)
+        with pytest.raises(impl.CBOREncodeTypeError, match="cannot serialize type DummyType"):
+            encoder.encode(DummyType())
+
+        encoder.default = lambda encoder, value: encoder.encode(1)
+        encoder.encode(DummyType())
+        assert stream.getvalue() == b"\x01"
+
+
 def test_default_cyclic(impl):
     class DummyType:
         def __init__(self, value=None):
@@ -480,6 +541,16 @@ def test_default_cyclic(impl):
     assert serialized == expected
 
 
+def test_encode_to_bytes_error(impl):
+    with BytesIO() as stream:
+        encoder = impl.CBOREncoder(stream)
+        with pytest.raises(impl.CBOREncodeTypeError):
+            encoder.encode_to_bytes([1, object()])
+
+        encoder.encode(1)
+        assert stream.getvalue() == b"\x01"
+
+
 def test_dump_to_file(impl, tmpdir):
     path = tmpdir.join("testdata.cbor")
     with path.open("wb") as fp:
@@ -548,6 +619,27 @@ def test_minimal_floats(impl, value, expected):
     assert impl.dumps(value, canonical=True) == expected
 
 
+@pytest.mark.parametrize(
+    "value",
+    [
+        pytest.param(list(range(256)), id="small_ints"),
+        pytest.param(list(range(-10, 40)), id="negative_ints"),
+        pytest.param(tuple(i * 1000 for i in range(40)), id="large_ints"),
+        pytest.param([0] * 20 + [-300, 1000] + [0] * 20, id="ints_out_of_range_inside"),
+        pytest.param([0] * 20 + [True, 1.0] + [0] * 20, id="ints_and_equal_values"),
+        pytest.param([1.5] + [2] * 40 + [1.5], id="floats_around_ints"),
+        pytest.param([i / 3 for i in range(-20, 20)] + [-0.0, 5e-324, 1e300], id="floats"),
+        pytest.param([1.5] * 40 + [float("nan")], id="floats_nan"),
+        pytest.param([1.5] * 40 + [1], id="mixed"),
+    ],
+)
+def test_long_array(impl, value):
+    expected = impl.dumps(len(value))
+    expected = bytes([expected[0] | 0x80]) + expected[1:]
+    expected += b"".join(impl.dumps(item) for item in value)
+    assert impl.dumps(value) == expected
+
+
 def test_tuple_key(impl):
     assert impl.dumps({(2, 1): ""}) == unhexlify("a182020160")
 
@@ -654,3 +746,79 @@ def test_invariant_encode_decode(impl, val):
     undergoing an encode and decode)
     """
     assert impl.loads(impl.dumps(val)) == val
+
+
+@dataclass
+class Record:
+    name: str
+    id: int
+    scores: list
+
+
+@pytest.mark.parametrize("string_referencing", [False, True])
+@pytest.mark.parametrize("tag", [None, 4000])
+def test_record_encoder(impl, tag, string_referencing):
+    value = Record("foo", 1, [2, "foo"])
+    expected_value = {"name": "foo", "id": 1, "scores": [2, "foo"]}
+    if tag is not None:
+        expected_value = impl.CBORTag(tag, expected_value)
+
+    expected = impl.dumps(
+        [expected_value, expected_value], canonical=True, string_referencing=string_referencing
+    )
+    encoded = impl.dumps(
+        [value, value],
+        default=record_encoder(Record, tag=tag),
+        string_referencing=string_referencing,
+    )
+    assert encoded == expected
+
+
+@pytest.mark.parametrize("string_referencing", [False, True])
+def test_record_encoder_fast_path(impl, string_referencing):
+    class RecordingEncoder(impl.CBOREncoder):
+        def encode(self, obj):
+            encoded_types.append(type(obj))
+            super().encode(obj)
+
+    encoded_types = []
+    encoder = RecordingEncoder(
+        BytesIO(), default=record_encoder(Record), string_referencing=string_referencing
+    )
+    assert encoder.string_referencing is string_referencing
+    encoder.encode(Record("foo", 1, []))
+    assert (dict in encoded_types) is string_referencing
+
+
+def test_record_encoder_fields(impl):
+    encoder = record_encoder(Record, fields=["id"])
+    assert impl.dumps(Record("foo", 1, []), default=encoder) == unhexlify("a162696401")
+    encoder = record_encoder(object, fields=[])
+    assert impl.dumps(object(), default=encoder) == unhexlify("a0")
+
+
+@pytest.mark.parametrize("fields", [["1st"], ["class"], ["a.b"], ["\ufb01"]])
+def test_record_encoder_invalid_field(fields):
+    with pytest.raises(ValueError, match="invalid attribute name"):
+        record_encoder(Record, fields=fields)
+
+
+def test_record_encoder_duplicate_field():
+    with pytest.raises(ValueError, match="duplicate attribute names"):
+        record_encoder(Record, fields=["id", "id"])
+
+
+def test_record_encoder_fields_string():
+    with pytest.raises(TypeError, match="not a string"):
+        record_encoder(Record, fields="id")
+
+
+@pytest.mark.parametrize("tag", [-1, 2**64])
+def test_record_encoder_invalid_tag(tag):
+    with pytest.raises(ValueError, match="invalid tag number"):
+        record_encoder(Record, tag=tag)
+
+
+def test_record_encoder_not_dataclass():
+    with pytest.raises(TypeError, match="is not a dataclass"):
+        record_encoder(object)